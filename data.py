@@ -1,9 +1,16 @@
 import pandas as pd
+import numpy as np
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 import openpyxl
-from openpyxl.utils.dataframe import dataframe_to_rows
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+_SAFE_SHEET_RE = re.compile(r'[\\/*?:\[\]]')
+
+# Every train dataframe covers the same 24 hours
+_TIME_STR = [f"{h}:00" for h in range(24)]
+_DWELL = 24 - np.arange(24, dtype=np.int32)  # hours remaining until end of day
 
 
 def load_departure_data(departure_file):
@@ -35,103 +42,153 @@ def load_hourly_counts(count_file):
     """
     print(f"\nLoading hourly counts from {count_file}...")
 
-    # Read all sheets from Excel file
-    excel_file = pd.ExcelFile(count_file)
-    sheet_names = excel_file.sheet_names
+    # Open the workbook once in read-only mode; each sheet is a small fixed-schema table
+    wb = openpyxl.load_workbook(count_file, read_only=True, data_only=True)
+    sheet_names = wb.sheetnames
     print(f"Found {len(sheet_names)} sheets (trains): {sheet_names[:5]}..." if len(
         sheet_names) > 5 else f"Found {len(sheet_names)} sheets (trains): {sheet_names}")
 
     hourly_data = {}
 
     # Process each sheet (each sheet is a train)
-    for sheet_name in sheet_names:
+    for ws in wb.worksheets:
+        sheet_name = ws.title
         train_name = sheet_name.strip()
 
-        # Read the sheet
-        df = pd.read_excel(count_file, sheet_name=sheet_name)
+        rows = [row for row in ws.iter_rows(values_only=True)
+                if any(value is not None for value in row)]
+
+        # Empty tab or missing columns: keep the train with no hourly data
+        header = list(rows[0]) if rows else []
+        if rows and ('Time' not in header or 'CAR_ARRIVING' not in header):
+            print(f"Warning: Missing 'Time' or 'CAR_ARRIVING' column in sheet '{sheet_name}'")
+            rows = []
+        if not rows:
+            hourly_data[train_name] = {}
+            print(f"Loaded train '{train_name}': 0 hours, 0 total cars")
+            continue
+
+        time_col = header.index('Time')
+        car_col = header.index('CAR_ARRIVING')
 
         # Debug: print structure of first sheet
         if sheet_name == sheet_names[0]:
             print(f"\nSample data structure from sheet '{sheet_name}':")
-            print(f"Columns: {df.columns.tolist()}")
-            print(f"Shape: {df.shape}")
-            print(df.head())
+            print(f"Columns: {header}")
+            print(f"Shape: ({len(rows) - 1}, {len(header)})")
+            for row in rows[1:6]:
+                print(row)
 
         # Create hourly counts dictionary for this train
         hourly_counts = {}
 
-        # Iterate through rows to get hourly data
-        for idx, row in df.iterrows():
-            time_str = str(row['Time'])  # e.g., "0:00", "1:00", etc.
+        for row in rows[1:]:
+            time_str = str(row[time_col])  # e.g., "0:00", "1:00", etc.
 
             # Extract hour from time string
             try:
                 hour = int(time_str.split(':')[0])
-                car_arriving = row['CAR_ARRIVING']
-                hourly_counts[hour] = int(car_arriving) if pd.notna(car_arriving) else 0
-            except:
+            except ValueError:
                 print(f"Warning: Could not parse time '{time_str}' in sheet '{sheet_name}'")
                 continue
 
+            # Missing or non-numeric counts are treated as 0
+            try:
+                hourly_counts[hour] = int(float(row[car_col]))
+            except (TypeError, ValueError):
+                hourly_counts[hour] = 0
+
         # Store the hourly data for this train
         hourly_data[train_name] = hourly_counts
 
         total_cars = sum(hourly_counts.values())
         print(f"Loaded train '{train_name}': {len(hourly_counts)} hours, {total_cars} total cars")
 
+    wb.close()
+
     print(f"\nLoaded hourly counts for {len(hourly_data)} trains")
     return hourly_data
 
 
-def create_train_dataframe(train_name, hourly_counts, departure_time, bocks):
+def compute_car_hours(car_arriving, total_car, total_car_hours):
     """
-    Create complete dataframe for a single train
+    Calculate CAR_HOURS backwards from hour 23:
+      hour 23: total_car_hours - total_car + 24 * car_arriving(23)
+      other hours: next hour's car_hours - total_car + 24 * car_arriving
+    The recurrence unrolls into a cumulative sum over the reversed arrivals
     """
-    hours = list(range(24))
-    data = {
-        'Train': [train_name] * 24,
-        'Time': [f"{h}:00" for h in hours],
-        'CAR_ARRIVING': [hourly_counts.get(h, 0) for h in hours]
-    }
+    tail = total_car_hours - total_car + 24 * car_arriving[-1]
+    deltas = 24 * car_arriving[:-1][::-1] - total_car
+    car_hours_rev = np.concatenate(([tail], tail + np.cumsum(deltas)))
+    return car_hours_rev[::-1]
 
-    df = pd.DataFrame(data)
 
-    # Calculate DWELL_HOURS (hours remaining until end of day)
-    df['DWELL_HOURS'] = df['Time'].apply(lambda x: 24 - int(x.split(':')[0]))
+def create_train_dataframe(train_name, hourly_counts, departure_time, bocks):
+    """
+    Create complete dataframe for a single train
+    """
+    car_arriving = np.array([hourly_counts.get(h, 0) for h in range(24)], dtype=np.int32)
 
     # Calculate CAR_ARRIVING_X_DWELL
-    df['CAR_ARRIVING_X_DWELL'] = df['CAR_ARRIVING'] * df['DWELL_HOURS']
+    car_x_dwell = car_arriving * _DWELL
 
     # Calculate totals
-    total_car = df['CAR_ARRIVING'].sum()
-    total_car_hours = df['CAR_ARRIVING_X_DWELL'].sum()
-
-    # Initialize CAR_HOURS column
-    df['CAR_HOURS'] = 0.0
-
-    # Calculate CAR_HOURS backwards from hour 23
-    for i in range(len(df) - 1, -1, -1):
-        hour = int(df.loc[i, 'Time'].split(':')[0])
-        car_arriving = df.loc[i, 'CAR_ARRIVING']
-
-        if hour == 23:
-            # Hour 23: total_car_hours - total_car + 24 * car_arriving(23)
-            df.loc[i, 'CAR_HOURS'] = total_car_hours - total_car + 24 * car_arriving
-        else:
-            # Other hours: next hour's car_hours - total_car + 24 * car_arriving
-            next_hour_idx = i + 1
-            next_car_hours = df.loc[next_hour_idx, 'CAR_HOURS']
-            df.loc[i, 'CAR_HOURS'] = next_car_hours - total_car + 24 * car_arriving
-
-    # Add summary information
-    df['TOTAL_CAR'] = total_car
-    df['TOTAL_CAR_HOURS'] = total_car_hours
-    df['DEPARTURE_TIME'] = departure_time
-    df['BOCKS'] = bocks
+    total_car = car_arriving.sum()
+    total_car_hours = car_x_dwell.sum()
+
+    car_hours = compute_car_hours(car_arriving, total_car, total_car_hours)
+
+    # Build the dataframe once, with summary information
+    df = pd.DataFrame({
+        'Train': [train_name] * 24,
+        'Time': _TIME_STR,
+        'CAR_ARRIVING': car_arriving,
+        'DWELL_HOURS': _DWELL,
+        'CAR_ARRIVING_X_DWELL': car_x_dwell,
+        'CAR_HOURS': car_hours.astype(np.float32),
+        'TOTAL_CAR': total_car,
+        'TOTAL_CAR_HOURS': total_car_hours,
+        'DEPARTURE_TIME': departure_time,
+        'BOCKS': bocks
+    })
+
+    # Columns repeating one value across all 24 rows are stored as categories
+    df = df.astype({col: 'category' for col in ['Train', 'DEPARTURE_TIME', 'BOCKS']})
 
     return df
 
 
+def process_train(train_name, hourly_counts, departure_time, bocks):
+    """
+    Build the train dataframe and summary row for a single train
+    Returns: (train_df, summary_row)
+    """
+    # Create train dataframe
+    train_df = create_train_dataframe(train_name, hourly_counts, departure_time, bocks)
+
+    # Extract summary metrics
+    total_car = train_df['TOTAL_CAR'].iloc[0]
+    total_car_hours = train_df['TOTAL_CAR_HOURS'].iloc[0]
+    avg_car_hours = total_car_hours / total_car if total_car > 0 else 0
+
+    min_car_hours_idx = train_df['CAR_HOURS'].idxmin()
+    min_car_hours = train_df.loc[min_car_hours_idx, 'CAR_HOURS']
+    min_car_hours_time = train_df.loc[min_car_hours_idx, 'Time']
+
+    summary_row = {
+        'Train': train_name,
+        'DEPT_TIME': departure_time,
+        'Bocks': bocks,
+        'TOTAL_CAR': total_car,
+        'TOTAL_CAR_HOURS': total_car_hours,
+        'AVG_CAR_HOURS': round(avg_car_hours, 2),
+        'MIN_CAR_HOURS': round(min_car_hours, 2),
+        'MIN_CAR_HOURS_TIME': min_car_hours_time
+    }
+
+    return train_df, summary_row
+
+
 def main(departure_file, count_file, output_file):
     """
     Main processing function
@@ -149,77 +206,67 @@ def main(departure_file, count_file, output_file):
     print(f"Processing {len(departure_df)} trains...")
     print(f"{'=' * 60}")
 
-    # Create Excel writer
-    writer = pd.ExcelWriter(output_file, engine='openpyxl')
+    # Collect train sheets and write them in one pass at the end
+    train_sheets = []
     summary_data = []
 
     processed_count = 0
     skipped_count = 0
 
-    # Process each train from departure schedule
-    for idx, row in departure_df.iterrows():
-        train_name = str(row['Train']).strip()
-        departure_time = row['Scheduled Departure']
-        bocks = row['Bocks']
+    # Trains are independent: compute them in worker processes, then
+    # collect results in departure order so the workbook is deterministic
+    with ProcessPoolExecutor() as executor:
+        futures = []
 
-        print(f"\n[{idx + 1}/{len(departure_df)}] Processing train: {train_name}")
-        print(f"  Departure: {departure_time}, Bocks: {bocks}")
+        # Process each train from departure schedule
+        for idx, row in departure_df.iterrows():
+            train_name = str(row['Train']).strip()
+            departure_time = row['Scheduled Departure']
+            bocks = row['Bocks']
 
-        # Get hourly counts for this train
-        if train_name not in hourly_data:
-            print(f"  Warning: No hourly data found for '{train_name}', skipping...")
-            skipped_count += 1
-            continue
+            print(f"\n[{idx + 1}/{len(departure_df)}] Processing train: {train_name}")
+            print(f"  Departure: {departure_time}, Bocks: {bocks}")
 
-        hourly_counts = hourly_data[train_name]
+            # Get hourly counts for this train
+            if train_name not in hourly_data:
+                print(f"  Warning: No hourly data found for '{train_name}', skipping...")
+                skipped_count += 1
+                continue
 
-        # Create train dataframe
-        train_df = create_train_dataframe(train_name, hourly_counts, departure_time, bocks)
+            futures.append(executor.submit(
+                process_train, train_name, hourly_data[train_name], departure_time, bocks))
 
-        # Extract summary metrics
-        total_car = train_df['TOTAL_CAR'].iloc[0]
-        total_car_hours = train_df['TOTAL_CAR_HOURS'].iloc[0]
-        avg_car_hours = total_car_hours / total_car if total_car > 0 else 0
+        for future in futures:
+            train_df, summary_row = future.result()
+            summary_data.append(summary_row)
 
-        min_car_hours_idx = train_df['CAR_HOURS'].idxmin()
-        min_car_hours = train_df.loc[min_car_hours_idx, 'CAR_HOURS']
-        min_car_hours_time = train_df.loc[min_car_hours_idx, 'Time']
+            # Create safe sheet name (Excel has 31 character limit)
+            train_name = summary_row['Train']
+            safe_sheet_name = _SAFE_SHEET_RE.sub('_', train_name)[:31]
+            train_sheets.append((safe_sheet_name, train_df))
 
-        summary_data.append({
-            'Train': train_name,
-            'DEPT_TIME': departure_time,
-            'Bocks': bocks,
-            'TOTAL_CAR': total_car,
-            'TOTAL_CAR_HOURS': total_car_hours,
-            'AVG_CAR_HOURS': round(avg_car_hours, 2),
-            'MIN_CAR_HOURS': round(min_car_hours, 2),
-            'MIN_CAR_HOURS_TIME': min_car_hours_time
-        })
+            processed_count += 1
+            print(
+                f"  Completed {train_name}! Total Cars: {summary_row['TOTAL_CAR']}, "
+                f"Total Car Hours: {summary_row['TOTAL_CAR_HOURS']:.2f}, Avg: {summary_row['AVG_CAR_HOURS']:.2f}")
 
-        # Create safe sheet name (Excel has 31 character limit)
-        safe_sheet_name = re.sub(r'[\\/*?:\[\]]', '_', train_name)[:31]
-        train_df.to_excel(writer, sheet_name=safe_sheet_name, index=False)
+    # Write Summary first, then each train sheet
+    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
+        if summary_data:
+            summary_df = pd.DataFrame(summary_data)
+            summary_df.to_excel(writer, sheet_name='Summary', index=False)
 
-        processed_count += 1
-        print(
-            f"  Completed! Total Cars: {total_car}, Total Car Hours: {total_car_hours:.2f}, Avg: {avg_car_hours:.2f}")
+            # to_excel writes datetime.time departures as text; keep them as Excel times
+            time_format = writer.book.add_format({'num_format': 'h:mm:ss'})
+            dept_col = summary_df.columns.get_loc('DEPT_TIME')
+            for r_idx, value in enumerate(summary_df['DEPT_TIME'], 1):
+                if isinstance(value, time):
+                    writer.sheets['Summary'].write_datetime(r_idx, dept_col, value, time_format)
 
-    writer.close()
+        for safe_sheet_name, train_df in train_sheets:
+            train_df.to_excel(writer, sheet_name=safe_sheet_name, index=False)
 
-    # Create summary sheet
     if summary_data:
-        summary_df = pd.DataFrame(summary_data)
-        wb = openpyxl.load_workbook(output_file)
-
-        if 'Summary' in wb.sheetnames:
-            del wb['Summary']
-        ws_summary = wb.create_sheet('Summary', 0)
-
-        for r_idx, row in enumerate(dataframe_to_rows(summary_df, index=False, header=True), 1):
-            for c_idx, value in enumerate(row, 1):
-                ws_summary.cell(row=r_idx, column=c_idx, value=value)
-
-        wb.save(output_file)
         print(f"\n{'=' * 60}")
         print(f" Summary sheet created with {len(summary_data)} trains")
         print(f"{'=' * 60}")
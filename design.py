@@ -1,38 +1,48 @@
 import numpy as np
+from numba import njit, prange
 from scipy.optimize import differential_evolution
 
+@njit(cache=True, fastmath=True)
 def objective(x):
-    n_s, n_p, B, n_r, L_p, L_s = x
+    n_s, n_p, B, n_r, L_p, L_s = x[0], x[1], x[2], x[3], x[4], x[5]
     penalty = 0.0
 
     # (1) width
     width = 30*n_s + (30*n_p + 45) + (150*B + 40)
-    if width > 1340:
-        penalty += (width - 1340)**2
+    d = max(0.0, width - 1340)
+    penalty += d*d
 
     # (2) length
     length = 12*n_r + 2*40
-    if length > 4500:
-        penalty += (length - 4500)**2
+    d = max(0.0, length - 4500)
+    penalty += d*d
 
-    # (3) order
-    if L_p >= L_s:
-        penalty += (L_p - L_s + 1)**2
+    # (3) order: penalised as soon as L_p reaches L_s
+    d = L_p - L_s + 1
+    penalty += (L_p >= L_s) * d*d
 
     # (4) parking
-    if B*(2*n_r) < n_p * L_p / 20:
-        penalty += (n_p * L_p / 20 - B*(2*n_r))**2
+    d = max(0.0, n_p * L_p / 20 - B*(2*n_r))
+    penalty += d*d
 
     # (5) proportional
-    if n_s < 0.2*n_p:
-        penalty += (0.2*n_p - n_s)**2
-    if n_s > 0.6*n_p:
-        penalty += (n_s - 0.6*n_p)**2
+    d1 = max(0.0, 0.2*n_p - n_s)
+    d2 = max(0.0, n_s - 0.6*n_p)
+    penalty += d1*d1 + d2*d2
 
     obj = -n_p * L_p
     return obj + 1e4 * penalty
 
 
+@njit(cache=True, parallel=True)
+def objective_population(X):
+    # X has shape (6, S): one column per candidate in the DE population
+    out = np.empty(X.shape[1])
+    for j in prange(X.shape[1]):
+        out[j] = objective(X[:, j])
+    return out
+
+
 bounds = [
     (1, 20),      # n_s
     (1, 20),      # n_p
@@ -44,13 +54,15 @@ bounds = [
 
 
 result = differential_evolution(
-    objective,
+    objective_population,
     bounds,
     maxiter=800,
     popsize=20,
     tol=1e-7,
     polish=True,
-    disp=False
+    disp=False,
+    vectorized=True,
+    updating='deferred'
 )
 
 n_s, n_p, B, n_r, L_p, L_s = result.x
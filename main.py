@@ -1,9 +1,16 @@
 import pandas as pd
+import numpy as np
 import re
-from datetime import datetime, timedelta
-import openpyxl
-from openpyxl.utils.dataframe import dataframe_to_rows
+from datetime import datetime, time, timedelta
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+_TIME_RE = re.compile(r'(\d+):(\d+)')
+_SAFE_SHEET_RE = re.compile(r'[\\/*?:\[\]]')
+
+# Every train dataframe covers the same 24 hours
+_TIME_STR = [f"{h}:00" for h in range(24)]
+_DWELL = 24 - np.arange(24, dtype=np.int32)  # hours remaining until end of day
 
 
 def parse_spare_blocks(spare_str):
@@ -41,7 +48,7 @@ def parse_time_from_column(time_str):
         return None
 
     time_str = str(time_str).strip()
-    match = re.match(r'(\d+):(\d+)', time_str)
+    match = _TIME_RE.match(time_str)
     if match:
         hour = int(match.group(1))
         return hour
@@ -60,130 +67,203 @@ def get_blocks_from_departure(blocks_str):
     return blocks
 
 
-def find_earliest_pull_time(yard_plan, train_name):
+def load_yard_plan(yard_plan_file, block_names):
     """
-    Find the earliest pull time for a specified train in yard_plan
+    Load only the yard_plan columns used downstream:
+    Time, Pull and SPARE columns as text, plus the block columns of departing trains
+    Returns: (yard_plan, block_columns)
     """
-    pull_columns = [col for col in yard_plan.columns if col.startswith('Pull')]
+    header = pd.read_csv(yard_plan_file, nrows=0).columns
+    text_columns = [col for col in header if col == 'Time' or col.startswith(('Pull', 'SPARE'))]
+    block_columns = [col for col in header if col in block_names]
 
+    # Block cells are left to type inference; non-numeric values are coerced later
+    yard_plan = pd.read_csv(yard_plan_file, usecols=text_columns + block_columns,
+                            dtype={col: str for col in text_columns}, engine='c')
+    return yard_plan, block_columns
+
+
+def find_earliest_pull_time(yard_counts, train_name):
+    """
+    Find the earliest pull time for a specified train in yard_plan
+    """
     earliest_time = None
     earliest_hour = None
 
-    for _, row in yard_plan.iterrows():
-        for col in pull_columns:
-            cell_value = row[col]
-            # Fix: Convert to string and handle NaN values
-            if pd.isna(cell_value):
-                continue
-            cell_value = str(cell_value)
-
-            if train_name in cell_value:
-                hour = parse_time_from_column(row.get('Time', ''))
-                if hour is not None:
-                    # Handle midnight crossing case
-                    if earliest_hour is None:
-                        earliest_hour = hour
-                        earliest_time = row['Time']
-                    elif hour == 23 and earliest_hour < 2:
-                        # 23:xx is earlier than 0:xx-1:xx (crossing midnight)
-                        earliest_hour = hour
-                        earliest_time = row['Time']
-                    elif hour < earliest_hour and not (earliest_hour == 23 and hour < 2):
-                        earliest_hour = hour
-                        earliest_time = row['Time']
+    # Rows where any Pull column mentions the train (literal substring match)
+    pulled = (np.char.find(yard_counts['pull_cells'], train_name) >= 0).any(axis=1)
+
+    for i in np.flatnonzero(pulled):
+        if np.isnan(yard_counts['hours'][i]):
+            continue
+        hour = int(yard_counts['hours'][i])
+
+        # Handle midnight crossing case
+        if earliest_hour is None:
+            earliest_hour = hour
+            earliest_time = yard_counts['times'][i]
+        elif hour == 23 and earliest_hour < 2:
+            # 23:xx is earlier than 0:xx-1:xx (crossing midnight)
+            earliest_hour = hour
+            earliest_time = yard_counts['times'][i]
+        elif hour < earliest_hour and not (earliest_hour == 23 and hour < 2):
+            earliest_hour = hour
+            earliest_time = yard_counts['times'][i]
 
     return earliest_time, earliest_hour
 
 
-def calculate_car_arriving(yard_plan, blocks, earliest_hour):
+def prepare_yard_counts(yard_plan, block_columns):
+    """
+    Precompute per-row hours, pull track text and car counts shared by all trains
+    Returns: dict with the time and hour of each row, the Pull column cells as
+    strings, a matrix of direct block column counts and a matrix of block
+    counts parsed from SPARE columns
+    """
+    # Parse the hour of every row, e.g. "0:00-0:15" -> 0
+    hours = yard_plan['Time'].map(parse_time_from_column).astype(float).to_numpy()
+
+    # Pull columns as one string array, empty where there is no train
+    pull_columns = [col for col in yard_plan.columns if col.startswith('Pull')]
+    pull_cells = yard_plan[pull_columns].astype(object).where(
+        yard_plan[pull_columns].notna(), '').to_numpy().astype(str)
+
+    spare_columns = [col for col in yard_plan.columns if col.startswith('SPARE')]
+
+    # Direct block columns (non-numeric cells count as 0)
+    block_mat = np.trunc(
+        yard_plan[block_columns].apply(pd.to_numeric, errors='coerce')).fillna(0).to_numpy()
+
+    # Blocks in spare columns, e.g. "2 CHBR 1 CHG" -> one column per block name
+    spare_blocks = yard_plan[spare_columns].stack().map(parse_spare_blocks)
+    spare_counts = (pd.DataFrame(spare_blocks.tolist(),
+                                 index=spare_blocks.index.get_level_values(0))
+                    .fillna(0).groupby(level=0).sum()
+                    .reindex(yard_plan.index, fill_value=0))
+
+    return {
+        'times': yard_plan['Time'].to_numpy(),
+        'hours': hours,
+        'pull_cells': pull_cells,
+        'block_mat': block_mat,
+        'block_idx': {col: i for i, col in enumerate(block_columns)},
+        'spare_mat': spare_counts.to_numpy(),
+        'spare_idx': {block: i for i, block in enumerate(spare_counts.columns)},
+    }
+
+
+def calculate_car_arriving(yard_counts, blocks, earliest_hour):
     """
     Calculate CAR ARRIVING for each hour
     Exclude the row at earliest_hour (clearing operation)
     """
-    hourly_counts = {h: 0 for h in range(24)}
+    block_cols = [i for col, i in yard_counts['block_idx'].items() if col in blocks]
+    spare_cols = [yard_counts['spare_idx'][b] for b in blocks if b in yard_counts['spare_idx']]
 
-    # Find all relevant block columns and spare columns
-    block_columns = []
-    spare_columns = []
+    row_counts = (yard_counts['block_mat'][:, block_cols].sum(axis=1)
+                  + yard_counts['spare_mat'][:, spare_cols].sum(axis=1))
+    row_counts = np.maximum(row_counts, 0)
 
-    for col in yard_plan.columns:
-        if col.startswith('SPARE'):
-            spare_columns.append(col)
-        elif col in blocks:
-            block_columns.append(col)
+    # Sum per hour, excluding the row at earliest_hour
+    hours = yard_counts['hours']
+    keep = ~np.isnan(hours) & (hours != earliest_hour)
+    totals = np.bincount(hours[keep].astype(int), weights=row_counts[keep], minlength=24)
+    hourly_counts = {h: int(count) for h, count in enumerate(totals)}
 
-    # Iterate through each row, excluding the row at earliest_hour
-    for _, row in yard_plan.iterrows():
-        hour = parse_time_from_column(row.get('Time', ''))
-
-        if hour is None or hour == earliest_hour:
-            continue
+    return hourly_counts
 
-        count = 0
 
-        # Count direct block columns
-        for block_col in block_columns:
-            val = row.get(block_col, 0)
-            if pd.notna(val) and str(val).replace('.', '').replace('-', '').isdigit():
-                count += int(float(val))
-                # print(f"column count: {count}")
+def compute_car_hours(car_arriving, total_car, total_car_hours):
+    """
+    Calculate CAR_HOURS working backwards from hour 23:
+      23pm: total_car_hours - total_car + 24 * car_arriving(23pm)
+      other hours: previous hour's car_hours - total_car + 24 * car_arriving
+    The recurrence unrolls into a cumulative sum over the reversed arrivals
+    """
+    tail = total_car_hours - total_car + 24 * car_arriving[-1]
+    deltas = 24 * car_arriving[:-1][::-1] - total_car
+    car_hours_rev = np.concatenate(([tail], tail + np.cumsum(deltas)))
+    return car_hours_rev[::-1]
 
-        # Count target blocks in spare columns
-        for spare_col in spare_columns:
-            spare_value = row.get(spare_col, '')
-            spare_blocks = parse_spare_blocks(spare_value)
-            for block in blocks:
-                if block in spare_blocks:
-                    count += spare_blocks[block]
 
+def create_train_dataframe(train_name, hourly_counts, departure_time):
+    """
+    Create complete dataframe for a single train
+    """
+    car_arriving = np.array([hourly_counts[h] for h in range(24)], dtype=np.int32)
 
-        hourly_counts[hour] += max(0,count)
+    car_x_dwell = car_arriving * _DWELL
+    total_car = car_arriving.sum()
+    total_car_hours = car_x_dwell.sum()
+    car_hours = compute_car_hours(car_arriving, total_car, total_car_hours)
 
+    # Build the dataframe once, with summary information
+    df = pd.DataFrame({
+        'Train': [train_name] * 24,
+        'Time': _TIME_STR,
+        'CAR_ARRIVING': car_arriving,
+        'DWELL_HOURS': _DWELL,
+        'CAR_ARRIVING_X_DWELL': car_x_dwell,
+        'CAR_HOURS': car_hours.astype(np.float32),
+        'TOTAL_CAR': total_car,
+        'TOTAL_CAR_HOURS': total_car_hours,
+        'DEPARTURE_TIME': departure_time
+    })
+
+    # Columns repeating one value across all 24 rows are stored as categories
+    df = df.astype({col: 'category' for col in ['Train', 'DEPARTURE_TIME']})
 
-    print(f"count: {count}; hourly counts: {hourly_counts}")
-    return hourly_counts
+    return df
 
 
-def create_train_dataframe(train_name, hourly_counts, departure_time):
+def process_train(train_name, departure_time, blocks, yard_counts):
     """
-    Create complete dataframe for a single train
+    Build the train dataframe and summary row for a single train
+    Returns: (earliest_time, earliest_hour, hourly_counts, train_df, summary_row),
+    or None if the train is not found in yard_plan
     """
-    hours = list(range(24))
-    data = {
-        'Train': [train_name] * 24,
-        'Time': [f"{h}:00" for h in hours],
-        'CAR_ARRIVING': [hourly_counts[h] for h in hours]
+    earliest_time, earliest_hour = find_earliest_pull_time(yard_counts, train_name)
+
+    if earliest_hour is None:
+        return None
+
+    hourly_counts = calculate_car_arriving(yard_counts, blocks, earliest_hour)
+
+    train_df = create_train_dataframe(train_name, hourly_counts, departure_time)
+
+    # Extract summary metrics
+    total_car = train_df['TOTAL_CAR'].iloc[0]
+    total_car_hours = train_df['TOTAL_CAR_HOURS'].iloc[0]
+    avg_car_hours = total_car_hours / total_car if total_car > 0 else 0
+
+    min_car_hours_idx = train_df['CAR_HOURS'].idxmin()
+    min_car_hours = train_df.loc[min_car_hours_idx, 'CAR_HOURS']
+    min_car_hours_time = train_df.loc[min_car_hours_idx, 'Time']
+
+    summary_row = {
+        'Train': train_name,
+        'DEPT_TIME': departure_time,
+        'TOTAL_CAR': total_car,
+        'TOTAL_CAR_HOURS': total_car_hours,
+        'AVG_CAR_HOURS': round(avg_car_hours,2),
+        'MIN_CAR_HOURS': min_car_hours,
+        'MIN_CAR_HOURS_TIME': min_car_hours_time
     }
 
-    print(f"data for {train_name}: {data}")
-    df = pd.DataFrame(data)
+    return earliest_time, earliest_hour, hourly_counts, train_df, summary_row
 
-    df['DWELL_HOURS'] = df['Time'].apply(lambda x: 24 - int(x.split(':')[0]))
-    df['CAR_ARRIVING_X_DWELL'] = df['CAR_ARRIVING'] * df['DWELL_HOURS']
-    total_car = df['CAR_ARRIVING'].sum()
-    total_car_hours = df['CAR_ARRIVING_X_DWELL'].sum()
-    df['CAR_HOURS'] = 0.0
 
+# Yard counts shared by all trains, set once per worker process
+_worker_yard_counts = None
 
-    for i in range(len(df) - 1, -1, -1): # Work backwards from hour 23
-        hour = int(df.loc[i, 'Time'].split(':')[0])
-        car_arriving = df.loc[i, 'CAR_ARRIVING']
 
-        if hour == 23:
-            # 23pm: total_car_hours - total_car + 24 * car_arriving(23pm)
-            df.loc[i, 'CAR_HOURS'] = total_car_hours - total_car + 24 * car_arriving
-        else:
-            # Other hours: previous hour's car_hours - total_car + current dwell * car_arriving
-            next_hour_idx = i + 1
-            prev_car_hours = df.loc[next_hour_idx, 'CAR_HOURS']
-            df.loc[i, 'CAR_HOURS'] = prev_car_hours - total_car + 24 * car_arriving
+def _init_worker(yard_counts):
+    global _worker_yard_counts
+    _worker_yard_counts = yard_counts
 
-    # Add summary information
-    df['TOTAL_CAR'] = total_car
-    df['TOTAL_CAR_HOURS'] = total_car_hours
-    df['DEPARTURE_TIME'] = departure_time
 
-    return df
+def _process_train_in_worker(train_name, departure_time, blocks):
+    return process_train(train_name, departure_time, blocks, _worker_yard_counts)
 
 
 def main(departure_file, yard_plan_file, output_file):
@@ -191,83 +271,81 @@ def main(departure_file, yard_plan_file, output_file):
     departure_df = pd.read_excel(departure_file, sheet_name='Worksheet1')
 
     print("Reading yard_plan...")
-    yard_plan = pd.read_csv(yard_plan_file)
+    block_names = set()
+    for blocks_str in departure_df['Bocks']:
+        block_names.update(get_blocks_from_departure(blocks_str))
+    yard_plan, block_columns = load_yard_plan(yard_plan_file, block_names)
 
     output_dir = os.path.dirname(output_file)
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir)
         print(f"Created directory: {output_dir}")
 
-    writer = pd.ExcelWriter(output_file, engine='openpyxl')
-    summary_data = []
-
-    for idx, row in departure_df.iterrows():
-        train_name = str(row['Train'])
-        departure_time = row['Scheduled Departure']
-        blocks_str = row['Bocks']
-
-        print(f"\nProcessing train: {train_name}")
-        print(f"  Scheduled departure: {departure_time}")
-        print(f"  Blocks: {blocks_str}")
-
-        blocks = get_blocks_from_departure(blocks_str)
+    yard_counts = prepare_yard_counts(yard_plan, block_columns)
 
-        if not blocks:
-            print(f"  Warning: {train_name} has no valid blocks information")
-            continue
-
-        earliest_time, earliest_hour = find_earliest_pull_time(yard_plan, train_name)
-
-        if earliest_hour is None:
-            print(f"  Warning: {train_name} not found in yard_plan")
-            continue
+    train_sheets = []
+    summary_data = []
 
-        print(f"  Earliest pull time: {earliest_time} (hour: {earliest_hour})")
+    # Trains are independent: compute them in worker processes (yard_counts is
+    # shipped once per worker), then report and collect results in departure
+    # order so the log and the workbook are deterministic
+    with ProcessPoolExecutor(initializer=_init_worker, initargs=(yard_counts,)) as executor:
+        jobs = []
+        for _, row in departure_df.iterrows():
+            train_name = str(row['Train'])
+            departure_time = row['Scheduled Departure']
+            blocks_str = row['Bocks']
+            blocks = get_blocks_from_departure(blocks_str)
+
+            future = None
+            if blocks:
+                future = executor.submit(_process_train_in_worker, train_name, departure_time, blocks)
+            jobs.append((train_name, departure_time, blocks_str, future))
+
+        for train_name, departure_time, blocks_str, future in jobs:
+            print(f"\nProcessing train: {train_name}")
+            print(f"  Scheduled departure: {departure_time}")
+            print(f"  Blocks: {blocks_str}")
+
+            if future is None:
+                print(f"  Warning: {train_name} has no valid blocks information")
+                continue
 
-        hourly_counts = calculate_car_arriving(yard_plan, blocks, earliest_hour)
+            result = future.result()
+            if result is None:
+                print(f"  Warning: {train_name} not found in yard_plan")
+                continue
 
-        train_df = create_train_dataframe(train_name, hourly_counts, departure_time)
+            earliest_time, earliest_hour, hourly_counts, train_df, summary_row = result
+            print(f"  Earliest pull time: {earliest_time} (hour: {earliest_hour})")
+            print(f"hourly counts: {hourly_counts}")
+            print(f"data for {train_name}: {train_df['CAR_ARRIVING'].tolist()}")
 
-        # Extract summary metrics
-        total_car = train_df['TOTAL_CAR'].iloc[0]
-        total_car_hours = train_df['TOTAL_CAR_HOURS'].iloc[0]
-        avg_car_hours = total_car_hours / total_car if total_car > 0 else 0
+            summary_data.append(summary_row)
 
-        min_car_hours_idx = train_df['CAR_HOURS'].idxmin()
-        min_car_hours = train_df.loc[min_car_hours_idx, 'CAR_HOURS']
-        min_car_hours_time = train_df.loc[min_car_hours_idx, 'Time']
+            safe_sheet_name = _SAFE_SHEET_RE.sub('_', train_name)[:31]
+            train_sheets.append((safe_sheet_name, train_df))
 
-        summary_data.append({
-            'Train': train_name,
-            'DEPT_TIME': departure_time,
-            'TOTAL_CAR': total_car,
-            'TOTAL_CAR_HOURS': total_car_hours,
-            'AVG_CAR_HOURS': round(avg_car_hours,2),
-            'MIN_CAR_HOURS': min_car_hours,
-            'MIN_CAR_HOURS_TIME': min_car_hours_time
-        })
+            print(f"  Completed! Total Cars: {summary_row['TOTAL_CAR']}, "
+                  f"Total Car Hours: {summary_row['TOTAL_CAR_HOURS']:.2f}, Avg: {summary_row['AVG_CAR_HOURS']:.2f}")
 
-        safe_sheet_name = re.sub(r'[\\/*?:\[\]]', '_', train_name)[:31]
-        train_df.to_excel(writer, sheet_name=safe_sheet_name, index=False)
+    # Write Summary first, then each train sheet
+    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
+        if summary_data:
+            summary_df = pd.DataFrame(summary_data)
+            summary_df.to_excel(writer, sheet_name='Summary', index=False)
 
-        print(f"  Completed! Total Cars: {total_car}, Total Car Hours: {total_car_hours:.2f}, Avg: {avg_car_hours:.2f}")
+            # to_excel writes datetime.time departures as text; keep them as Excel times
+            time_format = writer.book.add_format({'num_format': 'h:mm:ss'})
+            dept_col = summary_df.columns.get_loc('DEPT_TIME')
+            for r_idx, value in enumerate(summary_df['DEPT_TIME'], 1):
+                if isinstance(value, time):
+                    writer.sheets['Summary'].write_datetime(r_idx, dept_col, value, time_format)
 
-    writer.close()
+        for safe_sheet_name, train_df in train_sheets:
+            train_df.to_excel(writer, sheet_name=safe_sheet_name, index=False)
 
-    # Create summary sheet
     if summary_data:
-        summary_df = pd.DataFrame(summary_data)
-        wb = openpyxl.load_workbook(output_file)
-
-        if 'Summary' in wb.sheetnames:
-            del wb['Summary']
-        ws_summary = wb.create_sheet('Summary', 0)
-
-        for r_idx, row in enumerate(dataframe_to_rows(summary_df, index=False, header=True), 1):
-            for c_idx, value in enumerate(row, 1):
-                ws_summary.cell(row=r_idx, column=c_idx, value=value)
-
-        wb.save(output_file)
         print(f"\nSummary sheet created with {len(summary_data)} trains")
 
     print(f"\nResults saved to: {output_file}")
@@ -2,27 +2,21 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
-def time_to_angle(time_value):
-    if pd.isnull(time_value):
-        return np.nan
-    if isinstance(time_value, str):
-        try:
-            time_value = pd.to_datetime(time_value).time()
-        except:
-            return np.nan
-    return 2 * np.pi * (time_value.hour + time_value.minute / 60) / 24
+def times_to_angles(time_values):
+    times = pd.to_datetime(time_values.astype(str), format="mixed", errors="coerce")
+    return 2 * np.pi * (times.dt.hour + times.dt.minute / 60) / 24
 
 
-def plot_train_chart(inbound_file, outbound_file, save_path="yard_train_chart.png"):
+def plot_train_chart(inbound_file, outbound_file, save_path="yard_train_chart.png", seed=None):
     inbound_df = pd.read_excel(inbound_file, sheet_name="Schedule", usecols=["Train", "Scheduled Arrival"])
     inbound_df = inbound_df.dropna(subset=["Train", "Scheduled Arrival"])
-    inbound_df["Angle"] = inbound_df["Scheduled Arrival"].apply(time_to_angle)
+    inbound_df["Angle"] = times_to_angles(inbound_df["Scheduled Arrival"])
     inbound_df["Type"] = "Inbound"
 
     outbound_df = pd.read_csv(outbound_file, usecols=["Departure Train", "Departure Time"])
     outbound_df = outbound_df.rename(columns={"Departure Train": "Train", "Departure Time": "Time"})
     outbound_df = outbound_df.dropna(subset=["Train", "Time"])
-    outbound_df["Angle"] = outbound_df["Time"].apply(time_to_angle)
+    outbound_df["Angle"] = times_to_angles(outbound_df["Time"])
     outbound_df["Type"] = "Outbound"
 
     fig, ax = plt.subplots(figsize=(9, 9), subplot_kw={'projection': 'polar'})
@@ -37,33 +31,33 @@ def plot_train_chart(inbound_file, outbound_file, save_path="yard_train_chart.pn
     ax.add_artist(yard_circle)
     ax.text(0, 0, "Yard", color="black", ha="center", va="center", fontsize=10, fontweight='bold')
 
-    for _, row in inbound_df.iterrows():
-        angle = row["Angle"]
-        if np.isnan(angle):
-            continue
-        ax.annotate("",
-                    xy=(angle, yard_radius),     # head at center edge
-                    xytext=(angle, 1.0),         # tail at outer ring
-                    arrowprops=dict(arrowstyle="->", color="red", lw=1.5))
-        # Slight radial offset to reduce label overlap
-        label_radius = 1.05 + 0.03 * np.random.randn()
-        ax.text(angle, label_radius, row["Train"], color="red", fontsize=8,
+    # Slight radial offsets to reduce label overlap, drawn once per direction
+    rng = np.random.default_rng(seed)
+
+    inbound_df = inbound_df.dropna(subset=["Angle"])
+    in_angles = inbound_df["Angle"].to_numpy()
+    in_label_radii = 1.05 + 0.03 * rng.standard_normal(len(in_angles))
+    # Arrows from outer ring (tail) to center edge (head), drawn in one call
+    ax.quiver(in_angles, np.ones_like(in_angles), np.zeros_like(in_angles),
+              np.full_like(in_angles, yard_radius - 1.0),
+              angles='xy', scale_units='xy', scale=1, color="red", width=0.003)
+    for angle, label_radius, train in zip(in_angles, in_label_radii, inbound_df["Train"]):
+        ax.text(angle, label_radius, train, color="red", fontsize=8,
                 ha="center", va="center", rotation=np.degrees(-angle),
                 rotation_mode='anchor')
 
-    for _, row in outbound_df.iterrows():
-        angle = row["Angle"]
-        if np.isnan(angle):
-            continue
-        ax.annotate("",
-                    xy=(angle, 1.0),             # head at outer ring
-                    xytext=(angle, yard_radius), # tail near center
-                    arrowprops=dict(arrowstyle="->", color="green", lw=1.5))
-        # Slight radial offset to reduce label overlap
-        label_radius = 1.1 + 0.03 * np.random.randn()
-        ax.text(angle, label_radius, row["Train"], color="green", fontsize=8,
+    outbound_df = outbound_df.dropna(subset=["Angle"])
+    out_angles = outbound_df["Angle"].to_numpy()
+    out_label_radii = 1.1 + 0.03 * rng.standard_normal(len(out_angles))
+    # Arrows from center edge (tail) to outer ring (head), drawn in one call
+    ax.quiver(out_angles, np.full_like(out_angles, yard_radius), np.zeros_like(out_angles),
+              np.full_like(out_angles, 1.0 - yard_radius),
+              angles='xy', scale_units='xy', scale=1, color="green", width=0.003)
+    for angle, label_radius, train in zip(out_angles, out_label_radii, outbound_df["Train"]):
+        ax.text(angle, label_radius, train, color="green", fontsize=8,
                 ha="center", va="center", rotation=np.degrees(-angle),
                 rotation_mode='anchor')
+    ax.set_ylim(0, 1)
 
     ax.set_title("24-hour Yard Chart", fontsize=14, pad=25, fontweight='bold')
     ax.grid(alpha=0.3)